@@ -3,9 +3,12 @@ import json
 import os
 import sys
 import subprocess
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import boto3
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 
 from label_mapper import map_label
@@ -18,6 +21,15 @@ OTHER_OWNERS = "195275664570"
 ARCH = "x86_64"
 TERMINATION_LOG = "/dev/termination-log"
 
+# Zones are looked up concurrently against one shared (thread-safe) EC2 client;
+# adaptive retries keep the fan-out from failing on RequestLimitExceeded.
+MAX_WORKERS = 16
+DESCRIBE_IMAGES_PAGE_SIZE = 1000  # API maximum; keeps round-trips low for wide globs
+EC2_CONFIG = Config(retries={"max_attempts": 10, "mode": "adaptive"}, max_pool_connections=32)
+
+# match ubuntu-24.04, ubuntu-22.04, ubuntu-20.04 (case-insensitive)
+_UBUNTU_LTS_RE = re.compile(r"^ubuntu-(?:24\.04|22\.04|20\.04)$", re.IGNORECASE)
+
 def eprint(*args, **kwargs):
   print(*args, file=sys.stderr, **kwargs)
 
@@ -29,6 +41,24 @@ def require_env(name: str) -> str:
   return val
 
 
+def contains_pro(val: str) -> bool:
+  """
+  True if 'pro' appears as a standalone token, i.e. not preceded or followed by
+  an ASCII letter/digit (case-insensitive), using bytes.find, which runs in C.
+  Matching is ASCII-only: unlike the old IGNORECASE regex, Unicode case-folded
+  spellings such as 'ſ' or 'İ' never match, so non-ASCII input can differ.
+  """
+  # non-ASCII chars become '?', which (like in the regex) counts as a boundary
+  val_b = val.encode("ascii", "replace").lower()
+  n = len(val_b)
+  i = val_b.find(b"pro")
+  while i != -1:
+    if (i == 0 or not val_b[i - 1:i].isalnum()) and (i + 3 == n or not val_b[i + 3:i + 4].isalnum()):
+      return True
+    i = val_b.find(b"pro", i + 1)
+  return False
+
+
 def choose_owner(pattern_or_label: str) -> str:
   """
   If the pattern/nameLabel indicates an Ubuntu 24.04, 22.04, or 20.04 image,
@@ -37,42 +67,29 @@ def choose_owner(pattern_or_label: str) -> str:
   """
   if not pattern_or_label:
     return OTHER_OWNERS
-  # match ubuntu-24.04, ubuntu-22.04, ubuntu-20.04 (case-insensitive)
-  if re.search(r"^ubuntu-(?:24\.04|22\.04|20\.04)$", pattern_or_label, re.IGNORECASE):
+  if _UBUNTU_LTS_RE.match(pattern_or_label):
     return CANONICAL_OWNER
   return OTHER_OWNERS
 
-def find_latest_ami(region: str, pattern: str, owner: str) -> Optional[str]:
+@lru_cache(maxsize=128)
+def find_latest_ami(ec2, pattern: str, owner: str) -> Optional[str]:
   """
   Query EC2 for images owned by `owner` with the given name pattern and architecture.
   Returns the newest ImageId or None.
+  Results are memoized per (client, pattern, owner): zones sharing a nameLabel
+  resolve to the same regional AMI, so repeats don't hit describe_images again.
   """
-  session = boto3.session.Session(
-    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-    aws_session_token=os.environ.get("AWS_SESSION_TOKEN"),
-    region_name=region,
-  )
-  ec2 = session.client("ec2")
-
   name_value = f"{pattern}" if pattern else "*"
   filters = [
     {"Name": "name", "Values": [name_value]},
     {"Name": "architecture", "Values": [ARCH]},
     {"Name": "state", "Values": ["available"]},
+    # Narrow server-side so fewer images cross the wire and hit the pro scan below
+    {"Name": "image-type", "Values": ["machine"]},
   ]
-
-  try:
-    resp = ec2.describe_images(Owners=[owner], Filters=filters)
-  except (BotoCoreError, ClientError) as exc:
-    raise RuntimeError(str(exc)) from exc
-
-  images = resp.get("Images", [])
-  if not images:
-    return None
-
-  # regex to match 'pro' as a standalone token or preceded/followed by non-alphanumeric
-  pro_regex = re.compile(r"(?<![A-Za-z0-9])pro(?![A-Za-z0-9])", re.IGNORECASE)
+  # Official Canonical images are always public; other owners may be private or shared
+  if owner == CANONICAL_OWNER:
+    filters.append({"Name": "is-public", "Values": ["true"]})
 
   def looks_like_pro(img: Dict[str, Any]) -> bool:
     # Marketplace / paid images (ProductCodes present)
@@ -81,21 +98,33 @@ def find_latest_ami(region: str, pattern: str, owner: str) -> Optional[str]:
     # Check common textual fields for 'pro' (name, description, image location/source)
     for fld in ("Name", "Description", "ImageLocation"):
       val = img.get(fld)
-      if isinstance(val, str) and pro_regex.search(val):
+      if isinstance(val, str) and contains_pro(val):
         return True
     return False
 
-  print("Filter images to find free images")
-  # Exclude images that look like Pro/paid
-  free_images = [im for im in images if not looks_like_pro(im)]
-
-  if not free_images:
-    return None
-
-  # Sort by CreationDate ascending, pick the last (newest)
-  free_images.sort(key=lambda im: im.get("CreationDate", ""))
-  return free_images[-1].get("ImageId")
+  # Paginated per AWS guidance (unpaginated calls are prone to throttling/timeouts).
+  # Pages are not date-ordered, so keep a running newest free image instead of
+  # materializing the full result set.
+  newest: Optional[Dict[str, Any]] = None
+  try:
+    paginator = ec2.get_paginator("describe_images")
+    pages = paginator.paginate(
+      Owners=[owner],
+      Filters=filters,
+      PaginationConfig={"PageSize": DESCRIBE_IMAGES_PAGE_SIZE},
+    )
+    for page in pages:
+      for im in page.get("Images", []):
+        # Exclude images that look like Pro/paid
+        if looks_like_pro(im):
+          continue
+        # Newest by CreationDate (ISO-8601 strings compare chronologically)
+        if newest is None or im.get("CreationDate", "") > newest.get("CreationDate", ""):
+          newest = im
+  except (BotoCoreError, ClientError) as exc:
+    raise RuntimeError(str(exc)) from exc
 
+  return newest.get("ImageId") if newest else None
 
 def main():
   # Required env
@@ -121,42 +150,77 @@ def main():
   print(f"Using AWS region: {top_region}")
   print(f"Zones to search: {len(zones)}")
 
-  out_zones: List[Dict[str, Any]] = []
+  # Credentials (incl. optional AWS_SESSION_TOKEN) come from boto3's default
+  # chain, which reads the env vars validated above.
+  session = boto3.session.Session(region_name=top_region)
+  ec2 = session.client("ec2", config=EC2_CONFIG)
 
-  for z in zones:
+  # AMIs are region-scoped: zones sharing (nameLabel, pattern) resolve identically,
+  # so each distinct key is looked up once and fanned back out to its zones.
+  def zone_key(z: Dict[str, Any]) -> Tuple[str, str]:
     name_label = z.get("nameLabel", "")
-    pattern = z.get("pattern", "")
-    zone = z.get("zone", "")
+    return name_label, z.get("pattern", "") or name_label
+
+  # Workers buffer their log lines and return them with the result (None on
+  # failure), so each key's lines are printed together, in submission order.
+  def resolve(key: Tuple[str, str]) -> Tuple[Optional[str], List[Tuple[Any, str]]]:
+    name_label, pattern = key
     region = top_region
+    logs: List[Tuple[Any, str]] = []
 
-    pattern = pattern or name_label
     owner = choose_owner(name_label)
     if owner == CANONICAL_OWNER:
-      print(f"Pattern indicates official Ubuntu LTS; using Canonical owner {CANONICAL_OWNER}")
+      logs.append((sys.stdout, f"Pattern indicates official Ubuntu LTS; using Canonical owner {CANONICAL_OWNER}"))
     else:
-      print(f"Using owner '{OTHER_OWNERS}' for pattern '{pattern}'")
+      logs.append((sys.stdout, f"Using owner '{OTHER_OWNERS}' for pattern '{pattern}'"))
 
-    print(
-      f"Searching for AMI with pattern '{pattern}' in region '{region}' zone '{zone}' (nameLabel='{name_label}')"
-    )
+    logs.append((
+      sys.stdout,
+      f"Searching for AMI with pattern '{pattern}' in region '{region}' (nameLabel='{name_label}')"
+    ))
+    logs.append((sys.stdout, "Filter images to find free images"))
 
     try:
-      ami = find_latest_ami(region=region, pattern=pattern, owner=owner)
+      ami = find_latest_ami(ec2, pattern=pattern, owner=owner)
     except Exception as exc:
-      eprint(
-        f"EC2 describe-images failed for region '{region}' zone '{zone}' (nameLabel='{name_label}')"
-      )
-      eprint(str(exc))
-      # Match bash behavior: exit with non-zero on AWS call failure
-      sys.exit(1)
+      logs.append((
+        sys.stderr,
+        f"EC2 describe-images failed for region '{region}' pattern '{pattern}' (nameLabel='{name_label}')"
+      ))
+      logs.append((sys.stderr, str(exc)))
+      return None, logs
 
     # Normalize: if None-like -> empty / null in output
     ami_str = (ami or "").strip()
     if not ami_str or ami_str.lower() in {"none", "null"}:
       ami_str = ""
+    return ami_str, logs
+
+  keys = list(dict.fromkeys(zone_key(z) for z in zones))
+  resolved: Dict[Tuple[str, str], str] = {}
+  failed = False
+  if keys:
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(keys))) as ex:
+      for key, (ami_str, logs) in zip(keys, ex.map(resolve, keys)):
+        for stream, line in logs:
+          print(line, file=stream, flush=True)
+        if ami_str is None:
+          failed = True
+        else:
+          resolved[key] = ami_str
+  if failed:
+    # Match bash behavior: exit with non-zero on AWS call failure
+    sys.exit(1)
+
+  out_zones: List[Dict[str, Any]] = []
+  for z in zones:
+    key = zone_key(z)
+    name_label = key[0]
+    zone = z.get("zone", "")
+    ami_str = resolved[key]
 
     print(
-      f"Found AMI '{ami_str}' for region '{region}' zone '{zone}' (nameLabel='{name_label}')"
+      f"Found AMI '{ami_str}' for region '{top_region}' zone '{zone}' (nameLabel='{name_label}')"
     )
 
     out_zones.append(
@@ -172,7 +236,8 @@ def main():
   print(OUTPUT, flush=True)
   # write into /dev/termination-log (or provided output path)
   with open(output_path, "w") as f:
-    f.write(OUTPUT + "\n")
+    f.write(OUTPUT)
+    f.write("\n")
 
   sys.exit(0)
 
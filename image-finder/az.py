@@ -8,11 +8,14 @@ Exit codes:
 6 Azure SDK failure
 8 subscription not set / invalid
 """
+import datetime
 import json
 import os
 import re
 import sys
-from typing import Any, Dict, List, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from label_mapper import map_label 
 
 from azure.identity import ClientSecretCredential
@@ -20,6 +23,28 @@ from azure.mgmt.compute import ComputeManagementClient
 
 TERMINATION_LOG = "/dev/termination-log"
 
+# Canonical's Ubuntu catalog changes a few times a month; reuse a listing for a while.
+# The cache only helps across runs when IMAGE_CACHE_DIR is a persistent volume
+# (see pod.yaml); without one every pod starts cold and behaves as before.
+def _cache_ttl_seconds(default_hours: float = 6) -> int:
+    """IMAGE_CACHE_TTL_HOURS in seconds; malformed values fall back to the default, negatives to 0."""
+    try:
+        hours = float(os.environ.get("IMAGE_CACHE_TTL_HOURS", default_hours))
+        return max(0, int(hours * 3600))
+    except (ValueError, OverflowError):
+        return int(default_hours * 3600)
+
+IMAGE_CACHE_DIR = os.path.expanduser(os.environ.get("IMAGE_CACHE_DIR") or "~/.cache/image-finder")
+IMAGE_CACHE_TTL_SECONDS = _cache_ttl_seconds()
+
+# azure-core RetryPolicy settings: exponential backoff on 429/5xx (honouring
+# Retry-After) so the concurrent SKU/version fan-out survives ARM throttling.
+AZURE_RETRY_KWARGS = {
+    "retry_total": 6,
+    "retry_backoff_factor": 1,
+    "retry_backoff_max": 30,
+}
+
 def info(msg: str) -> None:
     print(f"INFO: {msg}")
 
@@ -42,8 +67,7 @@ def parse_int_parts(version: str) -> List[Any]:
             parts.append(p)
     return parts
 
-def choose_best_image(images: List[Dict[str, Any]], pattern: str, arch_hint: str = "x86") -> Optional[Dict[str, Any]]:
-    rx = re.compile(pattern, re.IGNORECASE)
+def choose_best_image(images: List[Dict[str, Any]], rx: "re.Pattern[str]", arch_hint: str = "x86") -> Optional[Dict[str, Any]]:
     arch = (arch_hint or "").lower()
 
     def arch_ok(img: Dict[str, Any]) -> bool:
@@ -72,12 +96,42 @@ def choose_best_image(images: List[Dict[str, Any]], pattern: str, arch_hint: str
     candidates.sort(key=lambda i: parse_int_parts(i.get("version", "0")), reverse=True)
     return candidates[0]
 
+def image_cache_path(subscription_id: str, location: str) -> str:
+    year, week, _ = datetime.date.today().isocalendar()
+    return os.path.join(IMAGE_CACHE_DIR, f"az_{subscription_id}_{location}_canonical_{year}w{week:02d}.json")
+
+def load_cached_images(path: str) -> Optional[List[Dict[str, Any]]]:
+    try:
+        if time.time() - os.path.getmtime(path) >= IMAGE_CACHE_TTL_SECONDS:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def store_cached_images(path: str, images: List[Dict[str, Any]]) -> None:
+    # Best effort: a read-only or missing home must not fail the run
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(images, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        info(f"Could not write image cache {path}: {e}")
+
 def list_images_via_sdk(subscription_id: str, location: str) -> List[Dict[str, Any]]:
     """
     Replaces `az vm image list --location <location>`.
     Traverses publishers -> offers -> skus -> versions and returns a flat list
     with fields roughly matching the CLI output we used before.
+    A listing younger than IMAGE_CACHE_TTL_SECONDS is served from disk.
     """
+    cache_path = image_cache_path(subscription_id, location)
+    cached = load_cached_images(cache_path)
+    if cached is not None:
+        info(f"Using cached image list from {cache_path} ({len(cached)} images)")
+        return cached
 
     # --- auth from AZ_CONFIG_JSON env (already validated by caller) ---
     az_cfg = os.environ.get("AZ_CONFIG_JSON", "{}")
@@ -94,7 +148,11 @@ def list_images_via_sdk(subscription_id: str, location: str) -> List[Dict[str, A
 
     # --- enumerate images ---
     try:
-        compute = ComputeManagementClient(credential=cred, subscription_id=subscription_id)
+        compute = ComputeManagementClient(
+            credential=cred,
+            subscription_id=subscription_id,
+            **AZURE_RETRY_KWARGS,
+        )
         
         publisher = "Canonical"
 
@@ -119,15 +177,25 @@ def list_images_via_sdk(subscription_id: str, location: str) -> List[Dict[str, A
         offers = compute.virtual_machine_images.list_offers(location, publisher)
         ubuntu_offers = [o.name for o in offers if is_ubuntu_offer(getattr(o, "name", None))]
 
-        for offer in ubuntu_offers:
+        # The SDK client is safe for concurrent reads: fan out SKU listings per
+        # offer, then version listings per (offer, sku), so wall time tracks
+        # tree depth rather than the total number of round-trips.
+        def offer_skus(offer: str) -> List[Tuple[str, str]]:
             skus = compute.virtual_machine_images.list_skus(location, publisher, offer)
-            for sk in skus:
-                sku = getattr(sk, "name", None)
-                if not sku:
-                    continue
+            return [(offer, sk.name) for sk in skus if getattr(sk, "name", None)]
+
+        def sku_versions(offer_sku: Tuple[str, str]) -> List[Any]:
+            offer, sku = offer_sku
+            # versions: we fetch a reasonable number for recency; adjust if needed
+            return list(compute.virtual_machine_images.list(location, publisher, offer, sku, top=2))
+
+        offer_sku_pairs: List[Tuple[str, str]] = []
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            for pairs in ex.map(offer_skus, ubuntu_offers):
+                offer_sku_pairs.extend(pairs)
 
-                # versions: we fetch a reasonable number for recency; adjust if needed
-                versions = compute.virtual_machine_images.list(location, publisher, offer, sku, top=2)
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            for (offer, sku), versions in zip(offer_sku_pairs, ex.map(sku_versions, offer_sku_pairs)):
                 for v in versions:
                     version = getattr(v, "name", None)  # version string like "2024.05.10"
                     if not version:
@@ -141,6 +209,9 @@ def list_images_via_sdk(subscription_id: str, location: str) -> List[Dict[str, A
                         "version": version,
                         "urn": urn,
                     })
+        # Don't let a transient empty listing hide every image for the full TTL
+        if out:
+            store_cached_images(cache_path, out)
         return out
     except Exception as e:
         err(f"Azure SDK failure while listing images: {e}")
@@ -190,17 +261,24 @@ def main() -> None:
 
     any_match = False
     out_zones: List[Dict[str, Any]] = []
+    # Map and compile once per distinct nameLabel; zones commonly share one
+    labels: Dict[str, str] = {
+        nl: map_label(nl)["azure"] or ""
+        for nl in {(z.get("nameLabel") or "").strip() for z in zones}
+    }
+    patterns: Dict[str, "re.Pattern[str]"] = {
+        p: re.compile(p, re.IGNORECASE) for p in set(labels.values())
+    }
 
     for z in zones:
         name_label = (z.get("nameLabel") or "").strip()
         zone = (z.get("zone") or "").strip()
 
-        mapped_label = map_label(name_label)["azure"]
-        pattern = mapped_label or ""
+        pattern = labels[name_label]
 
         print(f"Searching for image pattern '{pattern}' in region '{location}' zone '{zone}' (nameLabel='{name_label}')")
 
-        best = choose_best_image(images, pattern=pattern, arch_hint="x86")
+        best = choose_best_image(images, rx=patterns[pattern], arch_hint="x86")
         if best is None:
             err(f"No images matched for pattern '{pattern}' in zone '{zone}'.")
             out_zones.append({"nameLabel": name_label, "zone": zone, "name": None, "generation": None})
@@ -225,7 +303,8 @@ def main() -> None:
     print(OUTPUT, flush=True)
     #  print into /dev/termination-log
     with open(output_path, "w") as f:
-        f.write(OUTPUT + "\n")
+        f.write(OUTPUT)
+        f.write("\n")
 
     if not any_match:
         sys.exit(4)
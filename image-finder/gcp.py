@@ -2,9 +2,10 @@
 import os
 import sys
 import json
-import tempfile
 import re
-import atexit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
 from google.oauth2 import service_account
 from google.cloud import compute_v1
 from label_mapper import map_label 
@@ -41,6 +42,7 @@ TOP_REGION = os.getenv("REGION")
 output_path = os.environ.get("OUTPUT_PATH")
 ZONES = input_json.get("images", [])
 ARCH = "X86_64"
+MAX_WORKERS = 16
 
 if not TOP_REGION:
   err("Region missing from environment")
@@ -51,20 +53,11 @@ info(f"Zones to search: {len(ZONES)}")
 
 # -------- Auth --------
 credentials = None
-tmpkey = None
-
-def cleanup_tmp():
-  if tmpkey and os.path.exists(tmpkey):
-    os.remove(tmpkey)
-
-atexit.register(cleanup_tmp)
 
 try:
   if SERVICE_ACCOUNT_JSON:
-    tmpkey = tempfile.mktemp(suffix=".json")
-    with open(tmpkey, "w") as f:
-      f.write(SERVICE_ACCOUNT_JSON)
-    credentials = service_account.Credentials.from_service_account_file(tmpkey)
+    sa_info = json.loads(SERVICE_ACCOUNT_JSON)
+    credentials = service_account.Credentials.from_service_account_info(sa_info)
   else:
     err("No valid service account credentials provided")
     sys.exit(EXIT_AUTH_FAILURE)
@@ -80,16 +73,16 @@ if not GOOGLE_CLOUD_PROJECT:
 # -------- GCP client --------
 image_client = compute_v1.ImagesClient(credentials=credentials)
 
-OUT = []
-
-for z in ZONES:
-  name_label = z.get("nameLabel")
-  zone = z.get("zone")
+@lru_cache(maxsize=64)
+def label_pattern(mapped_label):
+  return re.compile(mapped_label)
 
-  if not name_label:
-    err("Missing nameLabel in zone entry; skipping")
-    OUT.append({"nameLabel": None, "zone": zone, "name": None})
-    continue
+def lookup(name_label):
+  """
+  Resolve a nameLabel to an image URI (or None). Log lines are buffered and
+  returned alongside the result so concurrent lookups don't interleave output.
+  """
+  logs = []
 
   # Detect GPU variant suffix and strip it before mapping
   is_gpu = False
@@ -102,52 +95,77 @@ for z in ZONES:
     mapped = map_label(base_label)
     mapped_label = mapped["gcp"]
   except Exception as e:
-    err(f"Failed to map '{name_label}' to GCP label: {e}")
-    OUT.append({"nameLabel": name_label, "zone": zone, "name": None})
-    continue
+    logs.append((sys.stderr, f"ERROR: Failed to map '{name_label}' to GCP label: {e}"))
+    return None, logs
 
   # If this is a GPU-specific label and the user supplied IMAGE_ID (or IMAGE_NAME),
   if is_gpu:
     uri = "projects/ubuntu-os-accelerator-images/global/images/ubuntu-accelerator-2404-amd64-with-nvidia-580-v20251121"
-    out_zone = {"nameLabel": name_label, "zone": zone, "name": uri}
-    OUT.append(out_zone)
-    continue
+    return uri, logs
 
   # Non-GPU flow: search ubuntu-os-cloud for images/families that match the mapped label
-  pattern = re.compile(mapped_label)
+  pattern = label_pattern(mapped_label)
 
+  # The family clause alone targets the label; name is still checked in Python below
   filter_expr = (
     '(status eq "READY") '
     '(architecture eq "X86_64") '
-    f'(name eq ".*{mapped_label}.*")'
     f'(family eq ".*{mapped_label}.*")'
   )
   req = compute_v1.ListImagesRequest(
       project="ubuntu-os-cloud",
-      filter=filter_expr,            
-      max_results=1,
+      filter=filter_expr,
     )
-  images = list(image_client.list(request=req))
-  print(f"Searching with filter: {req.filter}, found {len(images)} images", flush=True)
 
-  # Iterate until we find the newest image whose name OR family matches in Python
+  # Stream the pager and keep the newest image whose name OR family matches.
+  # creation_timestamp is RFC 3339 with a DST-dependent offset (-07:00/-08:00),
+  # so compare parsed datetimes rather than raw strings.
   latest = None
-  for img in images:
-    print(f".. Checking image: {img.name} (family: {img.family})", flush=True)
+  latest_ts = None
+  seen = 0
+  for img in image_client.list(request=req):
+    seen += 1
+    logs.append((sys.stdout, f".. Checking image: {img.name} (family: {img.family})"))
     name = getattr(img, "name", "") or ""
     family = getattr(img, "family", "") or ""
-    if pattern.search(name) or pattern.search(family):
-      latest = img
-      break
-
-  print(f".. Selected image: {latest.name if latest else 'None'}", flush=True)
+    if not (pattern.search(name) or pattern.search(family)):
+      continue
+    created = getattr(img, "creation_timestamp", "") or ""
+    try:
+      ts = datetime.fromisoformat(created)
+    except ValueError:
+      # An image with no usable creation time can't be ranked; skip it rather than fail the label
+      logs.append((sys.stdout, f".. Skipping image {name}: bad creation_timestamp {created!r}"))
+      continue
+    if latest is None or ts > latest_ts:
+      latest, latest_ts = img, ts
+  logs.append((sys.stdout, f"Searched with filter: {req.filter}, found {seen} images"))
+
+  logs.append((sys.stdout, f".. Selected image: {latest.name if latest else 'None'}"))
   if latest:
-    uri = latest.self_link.replace("https://www.googleapis.com/compute/v1/", "")
-    out_zone = {"nameLabel": name_label, "zone": zone, "name": uri}
-  else:
-    out_zone = {"nameLabel": name_label, "zone": zone, "name": None}
+    return latest.self_link.replace("https://www.googleapis.com/compute/v1/", ""), logs
+  return None, logs
+
+# Images are global to the project, not per zone: resolve each distinct
+# nameLabel once. ImagesClient is thread-safe, so lookups share the module-level
+# client; results (and their buffered logs) come back in submission order.
+labels = list(dict.fromkeys(z.get("nameLabel") for z in ZONES if z.get("nameLabel")))
+resolved = {}
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+  for name_label, (uri, logs) in zip(labels, ex.map(lookup, labels)):
+    for stream, line in logs:
+      print(line, file=stream, flush=True)
+    resolved[name_label] = uri
 
-  OUT.append(out_zone)
+OUT = []
+for z in ZONES:
+  name_label = z.get("nameLabel")
+  zone = z.get("zone")
+  if not name_label:
+    err("Missing nameLabel in zone entry; skipping")
+    OUT.append({"nameLabel": None, "zone": zone, "name": None})
+    continue
+  OUT.append({"nameLabel": name_label, "zone": zone, "name": resolved[name_label]})
 
 OUTPUT = {
   "region": TOP_REGION,
@@ -159,7 +177,8 @@ print(OUTPUT, flush=True)
 #  print into /dev/termination-log
 if output_path:
   with open(output_path, "w") as f:
-    f.write(OUTPUT + "\n")
+    f.write(OUTPUT)
+    f.write("\n")
 else:
   print("Warning: OUTPUT_PATH not set; not writing file", file=sys.stderr)
 
@@ -17,7 +17,6 @@ and will strip the suffix before producing mappings.
 from __future__ import annotations
 import argparse
 import json
-import re
 from typing import Dict, List, Optional
 
 # --- Canonical Ubuntu codename map (extend as needed) ---
@@ -56,23 +55,40 @@ FORMATTERS = {
   "azure": fmt_azure,
 }
 
+# The codename table is static, so every mapping is computed once at import.
+_PRECOMPUTED_MAPPINGS: Dict[str, Dict[str, str]] = {}
+for _version, _codename in UBUNTU_CODENAMES.items():
+  _PRECOMPUTED_MAPPINGS[_version] = {
+    provider: fmt(_version, _codename)
+    for provider, fmt in FORMATTERS.items()
+  }
+
 # --- Core logic ---
 # Accept optional "-gpu" suffix (but treat it as not part of the version string)
-_LABEL_RE = re.compile(r"^ubuntu-(\d{2}\.\d{2})(?:-gpu)?$")
-
 def _parse_label(label: str) -> Optional[str]:
   """
   Given a label like 'ubuntu-22.04' or 'ubuntu-22.04-gpu', return '22.04'.
   Return None if invalid.
   """
-  m = _LABEL_RE.match(label.strip().lower())
-  return m.group(1) if m else None
+  # Plain string checks for the fixed grammar ubuntu-NN.NN[-gpu]
+  s = label.strip().lower()
+  if s.endswith("-gpu"):
+    s = s[:-4]
+  if not s.startswith("ubuntu-"):
+    return None
+  v = s[7:]
+  if len(v) != 5 or v[2] != "." or not v.isascii():
+    return None
+  if not (v[:2].isdigit() and v[3:].isdigit()):
+    return None
+  return v
 
 def map_label(label: str) -> Dict[str, str]:
   """
   Map a single generic label (e.g., 'ubuntu-22.04' or 'ubuntu-22.04-gpu')
   to provider-specific names.
   Returns a dict like: {"aws": "...", "gcp": "...", "azure": "..."}.
+  Each call returns a fresh copy of the precomputed entry.
 
   Raises ValueError if the label is invalid or unknown.
   """
@@ -80,16 +96,12 @@ def map_label(label: str) -> Dict[str, str]:
   if not version:
     raise ValueError(f"Invalid label format: '{label}'. Expected 'ubuntu-YY.MM' or 'ubuntu-YY.MM-gpu'.")
 
-  codename = UBUNTU_CODENAMES.get(version)
-  if not codename:
+  mapping = _PRECOMPUTED_MAPPINGS.get(version)
+  if mapping is None:
     raise ValueError(
       f"Unknown Ubuntu version '{version}'. Add it to UBUNTU_CODENAMES."
     )
-
-  return {
-    provider: fmt(version, codename)
-    for provider, fmt in FORMATTERS.items()
-  }
+  return dict(mapping)
 
 def map_labels(labels: List[str]) -> Dict[str, Dict[str, str]]:
   """
@@ -99,10 +111,7 @@ def map_labels(labels: List[str]) -> Dict[str, Dict[str, str]]:
     ...
   }
   """
-  output = {}
-  for label in labels:
-    output[label] = map_label(label)
-  return output
+  return {label: map_label(label) for label in labels}
 
 # --- CLI ---
 def _default_extended_list() -> List[str]:
@@ -150,18 +159,16 @@ def main():
 
 def _print_table(data: Dict[str, Dict[str, str]]) -> None:
   # Simple pretty-printer without external deps.
-  labels = list(data.keys())
   col_names = ["label", "aws", "gcp", "azure"]
-  rows = []
-  for label in labels:
-    rows.append([
-      label,
-      data[label]["aws"],
-      data[label]["gcp"],
-      data[label]["azure"],
-    ])
-
-  widths = [max(len(str(x)) for x in col) for col in zip(col_names, *rows)]
+  rows = [[label, m["aws"], m["gcp"], m["azure"]] for label, m in data.items()]
+
+  # Column widths in one pass over the rows
+  widths = list(map(len, col_names))
+  for row in rows:
+    for i, cell in enumerate(row):
+      n = len(str(cell))
+      if n > widths[i]:
+        widths[i] = n
   def fmt_row(row): return " | ".join(s.ljust(w) for s, w in zip(row, widths))
 
   print(fmt_row(col_names))
@@ -14,6 +14,8 @@ Environment variables:
   FAMILY               Instance family prefix, e.g., m7i, c7g, g5
   AWS_PROFILE          AWS CLI profile name (optional)
   SPOT_LOOKBACK_HOURS  Hours to look back for spot price (default: 24)
+  CACHE_DIR            Disk cache for offerings/type specs (default: ~/.cache/instance-finder)
+  CACHE_TTL_HOURS      Max age of disk cache entries (default: 24; 0 disables reuse)
 """
 
 import os
@@ -21,7 +23,40 @@ import boto3
 import botocore
 import json
 import datetime
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache, wraps
+from botocore.config import Config
+
+# orjson parses the large Pricing API documents noticeably faster; the stdlib
+# json module stays as a drop-in fallback when it isn't installed.
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Price lookups are network-bound and independent, so they fan out over a thread
+# pool sharing the (thread-safe) boto3 clients. Adaptive retries absorb the
+# throttling that the extra concurrency invites.
+PRICE_WORKERS = 16
+CLIENT_CONFIG = Config(retries={"max_attempts": 10, "mode": "adaptive"}, max_pool_connections=32)
+
+# Instance type offerings/specs change on the order of weeks; warm runs reuse them.
+# Reuse across runs needs CACHE_DIR on a persistent volume (see pod.yaml);
+# without one every pod starts cold.
+def _cache_ttl_seconds(default_hours=24):
+    """CACHE_TTL_HOURS in seconds; malformed values fall back to the default, negatives to 0."""
+    try:
+        hours = float(os.environ.get("CACHE_TTL_HOURS", default_hours))
+        return max(0, int(hours * 3600))
+    except (ValueError, OverflowError):
+        return int(default_hours * 3600)
+
+CACHE_DIR = os.path.expanduser(os.environ.get("CACHE_DIR") or "~/.cache/instance-finder")
+CACHE_TTL_SECONDS = _cache_ttl_seconds()
 
 # ---------- helpers ----------
 
@@ -29,7 +64,7 @@ def dec_to_str_money(x):
     if x is None:
         return ""
     try:
-        d = Decimal(str(x))
+        d = x if isinstance(x, Decimal) else Decimal(str(x))
         return str(d.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
     except Exception:
         return ""
@@ -60,13 +95,78 @@ def paginate(client, method_name, result_key, **kwargs):
         for item in page.get(result_key, []):
             yield item
 
-def get_offered_instance_types_in_az(ec2, az: str):
+def paginate_all(client, method_name, **kwargs):
+    """Merge every page into one response dict; for results consumed as a whole."""
+    return client.get_paginator(method_name).paginate(**kwargs).build_full_result()
+
+def cache_load(name):
+    path = os.path.join(CACHE_DIR, f"aws_{name}.json")
+    try:
+        if time.time() - os.path.getmtime(path) >= CACHE_TTL_SECONDS:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cache_store(name, value):
+    # Best effort: a read-only or missing home must not fail the run
+    path = os.path.join(CACHE_DIR, f"aws_{name}.json")
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"  Could not write cache {path}: {e}", flush=True)
+
+def disk_cached(key_fn, encode=lambda v: v, decode=lambda v: v):
+    """
+    Serve fn(*args) from the JSON cache entry named key_fn(*args) while it is
+    younger than CACHE_TTL_SECONDS; otherwise call through and store the result.
+    Empty results are not stored, so a transient empty response isn't replayed.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args):
+            name = key_fn(*args)
+            cached = cache_load(name)
+            if cached is not None:
+                return decode(cached)
+            result = fn(*args)
+            if result:
+                cache_store(name, encode(result))
+            return result
+        return wrapper
+    return deco
+
+def caller_account_id(session, region, access_key_id):
+    """
+    AWS account ID of the run's credentials. AZ names map to physical zones per
+    account, so disk cache keys are scoped by it. Falls back to a hash of the
+    access key ID when STS is unreachable.
+    """
+    try:
+        sts = session.client("sts", region_name=region, config=CLIENT_CONFIG)
+        return sts.get_caller_identity()["Account"]
+    except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError):
+        return "key" + hashlib.sha1((access_key_id or "").encode()).hexdigest()[:16]
+
+def _offerings_cache_key(ec2, account, az, families):
+    digest = hashlib.sha1(",".join(sorted(f.lower() for f in families)).encode()).hexdigest()[:16]
+    return f"offerings_{account}_{ec2.meta.region_name}_{az}_{digest}"
+
+@disk_cached(_offerings_cache_key, encode=sorted, decode=set)
+def get_offered_instance_types_in_az(ec2, account: str, az: str, families: list[str]):
     offered = set()
+    filters = [{"Name": "location", "Values": [az]}]
+    if families:
+        # Server-side prefix match, same semantics as filter_by_family
+        filters.append({"Name": "instance-type", "Values": [f"{fam.lower()}*" for fam in families]})
     params = {
         "LocationType": "availability-zone",
-        "Filters": [
-            {"Name": "location", "Values": [az]},
-        ]
+        "Filters": filters,
     }
     for it in paginate(ec2, "describe_instance_type_offerings", "InstanceTypeOfferings", **params):
         t = it.get("InstanceType")
@@ -80,14 +180,23 @@ def filter_by_family(instance_types, family_prefix: list[str]):
     print(f"Filtering by family prefix: '{family_prefix}'")
     return {t for t in instance_types if any(t.lower().startswith(pref.lower()) for pref in family_prefix)}
 
-def describe_types(ec2, types):
+def _types_cache_key(ec2, account, types):
+    digest = hashlib.sha1(",".join(sorted(types)).encode()).hexdigest()[:16]
+    return f"types_{account}_{ec2.meta.region_name}_{digest}"
+
+@disk_cached(_types_cache_key)
+def describe_types(ec2, account, types):
+    # The API caps InstanceTypes at 100 per request; describe the chunks concurrently.
+    def describe_chunk(chunk):
+        return list(paginate(ec2, "describe_instance_types", "InstanceTypes", InstanceTypes=chunk))
+
     out = {}
     types = list(types)
-    for i in range(0, len(types), 100):
-        chunk = types[i:i+100]
-        resp = ec2.describe_instance_types(InstanceTypes=chunk)
-        for it in resp.get("InstanceTypes", []):
-            out[it["InstanceType"]] = it
+    chunks = [types[i:i+100] for i in range(0, len(types), 100)]
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        for described in ex.map(describe_chunk, chunks):
+            for it in described:
+                out[it["InstanceType"]] = it
     return out
 
 def extract_gpu_info(it_desc):
@@ -120,7 +229,62 @@ def extract_gpu_info(it_desc):
         "memory": memory_str,
     }
 
+def _hourly_usd_prices(prod):
+    """Yield each hourly USD on-demand price in a parsed PriceList product."""
+    terms = prod.get("terms", {}).get("OnDemand", {})
+    for term in terms.values():
+        price_dims = term.get("priceDimensions", {})
+        for dim in price_dims.values():
+            if dim.get("unit") == "Hrs":
+                price_str = dim.get("pricePerUnit", {}).get("USD")
+                if price_str is not None:
+                    try:
+                        yield Decimal(price_str)
+                    except Exception:
+                        pass
+
+def _lowest_price(prices):
+    """
+    The on-demand pricing rule shared by the region-wide and per-type lookups:
+    the lowest non-zero price, or None if there is none.
+    """
+    return min((p for p in prices if p > 0), default=None)
+
+def load_region_ondemand_prices(pricing, region_code: str):
+    """
+    Map instanceType -> lowest non-zero hourly Linux on-demand price for the
+    whole region, from a single paginated get_products stream (no per-type
+    filter). Returns an empty dict if the Pricing API is unreachable.
+    """
+    flt = [
+        {"Type": "TERM_MATCH", "Field": "operatingSystem", "Value": "Linux"},
+        {"Type": "TERM_MATCH", "Field": "tenancy", "Value": "Shared"},
+        {"Type": "TERM_MATCH", "Field": "preInstalledSw", "Value": "NA"},
+        {"Type": "TERM_MATCH", "Field": "capacitystatus", "Value": "Used"},
+        {"Type": "TERM_MATCH", "Field": "regionCode", "Value": region_code},
+    ]
+    prices = {}
+    try:
+        for raw in paginate(pricing, "get_products", "PriceList", ServiceCode="AmazonEC2", Filters=flt, MaxResults=100):
+            prod = _loads(raw)
+            it = prod.get("product", {}).get("attributes", {}).get("instanceType")
+            if not it:
+                continue
+            price = _lowest_price(_hourly_usd_prices(prod))
+            if price is not None and (it not in prices or price < prices[it]):
+                prices[it] = price
+    except botocore.exceptions.BotoCoreError:
+        return {}
+    return prices
+
+# On-demand price depends on region, not zone: memoize so multi-zone runs price
+# each type once. The pricing client hashes by identity, so it's a stable key part.
+@lru_cache(maxsize=4096)
 def on_demand_price_usd_per_hour(pricing, region_code: str, instance_type: str):
+    """
+    Lowest non-zero hourly Linux on-demand price for one type, the same rule as
+    load_region_ondemand_prices; used for types missing from the bulk listing.
+    """
     try:
         flt = [
             {"Type": "TERM_MATCH", "Field": "instanceType", "Value": instance_type},
@@ -139,42 +303,43 @@ def on_demand_price_usd_per_hour(pricing, region_code: str, instance_type: str):
                 Filters=attempt,
                 MaxResults=100
             )
-            for raw in pages:
-                prod = json.loads(raw)
-                terms = prod.get("terms", {}).get("OnDemand", {})
-                for term in terms.values():
-                    price_dims = term.get("priceDimensions", {})
-                    for dim in price_dims.values():
-                        if dim.get("unit") == "Hrs":
-                            price_str = dim.get("pricePerUnit", {}).get("USD")
-                            if price_str is not None:
-                                try:
-                                    return Decimal(price_str)
-                                except Exception:
-                                    pass
+            price = _lowest_price(p for raw in pages for p in _hourly_usd_prices(_loads(raw)))
+            if price is not None:
+                return price
         return None
     except botocore.exceptions.BotoCoreError:
         return None
 
-def recent_spot_price_usd_per_hour(ec2, az: str, instance_type: str, lookback_hours=24):
-    end = datetime.datetime.utcnow()
+def spot_prices_for_zone(ec2, az: str, instance_types, lookback_hours=24):
+    """
+    Latest Linux spot price per instance type in `az`, from one paginated
+    describe_spot_price_history call covering all `instance_types`.
+    Types without history are absent from the returned dict.
+    """
+    instance_types = list(instance_types)
+    if not instance_types:
+        return {}
+    end = datetime.datetime.now(datetime.timezone.utc)
     start = end - datetime.timedelta(hours=lookback_hours)
+    latest = {}
     try:
-        resp = ec2.describe_spot_price_history(
-            InstanceTypes=[instance_type],
+        history = paginate_all(
+            ec2,
+            "describe_spot_price_history",
+            InstanceTypes=instance_types,
             ProductDescriptions=["Linux/UNIX"],
             AvailabilityZone=az,
             StartTime=start,
             EndTime=end,
-            MaxResults=1000
+            PaginationConfig={"PageSize": 1000},
         )
-        hist = resp.get("SpotPriceHistory", [])
-        if not hist:
-            return None
-        latest = max(hist, key=lambda x: x["Timestamp"])
-        return Decimal(latest["SpotPrice"])
+        for rec in history.get("SpotPriceHistory", []):
+            it = rec["InstanceType"]
+            if it not in latest or rec["Timestamp"] > latest[it]["Timestamp"]:
+                latest[it] = rec
     except botocore.exceptions.BotoCoreError:
-        return None
+        return {}
+    return {it: Decimal(rec["SpotPrice"]) for it, rec in latest.items()}
 
 # ---------- main ----------
 
@@ -229,48 +394,76 @@ def main():
 
     session = boto3.Session(aws_access_key_id=ACCESS_KEY_ID, aws_secret_access_key=SECRET_ACCESS_KEY)
 
-    ec2 = session.client("ec2", region_name=region)
-    ec2_pricing = session.client("ec2", region_name="us-east-1")
-    pricing = session.client("pricing", region_name="us-east-1")
-    
-    zones_out = []
+    ec2 = session.client("ec2", region_name=region, config=CLIENT_CONFIG)
+    ec2_pricing = session.client("ec2", region_name="us-east-1", config=CLIENT_CONFIG)
+    pricing = session.client("pricing", region_name="us-east-1", config=CLIENT_CONFIG)
+    account = caller_account_id(session, region, ACCESS_KEY_ID)
+
+    print(f"Loading on-demand prices for {region}...", flush=True)
+    ondemand_prices = load_region_ondemand_prices(pricing, region)
+    print(f"  Loaded on-demand prices for {len(ondemand_prices)} instance types", flush=True)
+
+    def describe_base(it_name, it_desc):
+        vcpus = it_desc.get("VCpuInfo", {}).get("DefaultVCpus", 0)
+        ram_gib_str = mib_to_gb_str(it_desc.get("MemoryInfo", {}).get("SizeInMiB"))
+        gpu_info = extract_gpu_info(it_desc)
+
+        ond = ondemand_prices.get(it_name)
+        if ond is None:
+            # Not in the region-wide listing: fall back to the targeted lookup
+            ond = on_demand_price_usd_per_hour(pricing, region, it_name)
+
+        gpu_enabled = gpu_info.get("enabled", False)
+        if gpu_enabled:
+            nameLabel = f"{vcpus}vCPU-{ram_gib_str}-{gpu_info['count']}x{gpu_info['model']}-{gpu_info['memory']}"
+        else:
+            nameLabel = f"{vcpus}vCPU-{ram_gib_str}"
+
+        return {
+            "name": it_name,
+            "nameLabel": nameLabel,
+            "vcpus": vcpus,
+            "ram": ram_gib_str,
+            "price": dec_to_str_money(ond),
+            "gpu": {
+                "enabled": gpu_info["enabled"],
+                "manufacturer": gpu_info["manufacturer"],
+                "count": gpu_info["count"],
+                "model": gpu_info["model"],
+                "memory": gpu_info["memory"],
+            },
+        }
+
+    # Zone-independent fields are computed once for the union of candidates;
+    # the per-zone pass below only adds spot prices.
+    zone_candidates = {}
     for zone in zones:
         print(f"Processing zone: {zone}", flush=True)
-        offered = get_offered_instance_types_in_az(ec2, zone)
-        print(f"  Found {len(offered)} offered instance types in {zone}", flush=True)
-        candidates = filter_by_family(offered, families)
-        print(f"  {len(candidates)} match family '{families}'", flush=True)
-        described = describe_types(ec2_pricing, sorted(candidates))
-        print(f"  Retrieved descriptions for {len(described)} instance types", flush=True)
+        offered = get_offered_instance_types_in_az(ec2, account, zone, families)
+        print(f"  Found {len(offered)} offered instance types in {zone} for family '{families}'", flush=True)
+        # Already filtered server-side; kept as a cheap sanity check
+        zone_candidates[zone] = filter_by_family(offered, families)
+        print(f"  {len(zone_candidates[zone])} match family '{families}'", flush=True)
 
-        flavors = []
-        for it_name, it_desc in sorted(described.items(), key=lambda kv: kv[0]):
-            vcpus = it_desc.get("VCpuInfo", {}).get("DefaultVCpus", 0)
-            ram_gib_str = mib_to_gb_str(it_desc.get("MemoryInfo", {}).get("SizeInMiB"))
-            gpu_info = extract_gpu_info(it_desc)
+    all_candidates = sorted(set().union(*zone_candidates.values()))
+    described = describe_types(ec2_pricing, account, all_candidates)
+    print(f"Retrieved descriptions for {len(described)} instance types", flush=True)
 
-            ond = on_demand_price_usd_per_hour(pricing, region, it_name)
-            spot = recent_spot_price_usd_per_hour(ec2, zone, it_name, lookback_hours=spot_hours)
+    all_names = sorted(described)
+    with ThreadPoolExecutor(max_workers=PRICE_WORKERS) as executor:
+        base = dict(zip(all_names, executor.map(describe_base, all_names, [described[n] for n in all_names])))
 
-            gpu_enabled = gpu_info.get("enabled", False)
-            if gpu_enabled:
-                nameLabel = f"{vcpus}vCPU-{ram_gib_str}-{gpu_info['count']}x{gpu_info['model']}-{gpu_info['memory']}"
-            else:
-                nameLabel = f"{vcpus}vCPU-{ram_gib_str}"
+    zones_out = []
+    for zone in zones:
+        names = sorted(n for n in zone_candidates[zone] if n in base)
+        spot_map = spot_prices_for_zone(ec2, zone, names, lookback_hours=spot_hours)
+        print(f"  Retrieved spot prices for {len(spot_map)} instance types in {zone}", flush=True)
 
+        flavors = []
+        for n in names:
+            spot = spot_map.get(n)
             flavors.append({
-                "name": it_name,
-                "nameLabel": nameLabel,
-                "vcpus": vcpus,
-                "ram": ram_gib_str,
-                "price": dec_to_str_money(ond),
-                "gpu": {
-                    "enabled": gpu_info["enabled"],
-                    "manufacturer": gpu_info["manufacturer"],
-                    "count": gpu_info["count"],
-                    "model": gpu_info["model"],
-                    "memory": gpu_info["memory"],
-                },
+                **base[n],
                 "spot": {
                     "price": dec_to_str_money(spot),
                     "enabled": spot is not None
@@ -43,12 +43,15 @@ import os
 import re
 import sys
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
 from typing import Dict, Iterable, List, Optional, Tuple
 
 # ----- Dependencies -----
 # pip install azure-identity azure-mgmt-compute requests
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from azure.identity import ClientSecretCredential
 from azure.mgmt.compute import ComputeManagementClient
 from azure.mgmt.compute.models import ResourceSku
@@ -96,13 +99,16 @@ def normalize_family_match_tokens(family: str) -> List[str]:
     toks.add(f"Standard_{f.replace('_', '')}")
     return list(toks)
 
-def size_matches_family(size_name: str, families: List[str]) -> bool:
-    s_lower = size_name.lower().replace("_", "")
-    for fam in families:
-        for tok in normalize_family_match_tokens(fam):
-            if s_lower.startswith(tok.lower().replace("_", "")):
-                return True
-    return False
+def family_match_prefixes(families: List[str]) -> Tuple[str, ...]:
+    """Flatten the match tokens of all families into lowercase, underscore-free prefixes."""
+    return tuple({
+        tok.lower().replace("_", "")
+        for fam in families
+        for tok in normalize_family_match_tokens(fam)
+    })
+
+def size_matches_family(size_name: str, prefixes: Tuple[str, ...]) -> bool:
+    return size_name.lower().replace("_", "").startswith(prefixes)
 
 def get_capability(capabilities: Iterable, key: str) -> Optional[str]:
     for c in capabilities or []:
@@ -141,6 +147,17 @@ def sku_supported_zones(sku: ResourceSku, region: str) -> List[str]:
 
 RETAIL_API = "https://prices.azure.com/api/retail/prices"
 
+# One pooled session: NextPageLink follows reuse the TCP/TLS connection, and
+# throttling (429) or transient 5xx responses are retried with backoff.
+SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+)
+SESSION.mount("http://", _ADAPTER)
+SESSION.mount("https://", _ADAPTER)
+
 def _retail_iter(params: Dict[str, str]) -> Iterable[dict]:
     """
     Iterate the Azure Retail Prices API with simple query params.
@@ -149,7 +166,7 @@ def _retail_iter(params: Dict[str, str]) -> Iterable[dict]:
     url = RETAIL_API
     while url:
         # print(f"Params: {params}", flush=True)
-        resp = requests.get(url, params=params if url == RETAIL_API else None, timeout=10,verify=False)
+        resp = SESSION.get(url, params=params if url == RETAIL_API else None, timeout=10)
         # print(f"  Status: {resp.status_code}", flush=True)
         resp.raise_for_status()
         data = resp.json()
@@ -157,91 +174,67 @@ def _retail_iter(params: Dict[str, str]) -> Iterable[dict]:
             yield item
         url = data.get("NextPageLink")
 
-def short_size_name(size_name: str) -> str:
-    """
-    Azure retail API often uses 'skuName' like 'D4s v5', 'E16ads v5', etc.
-    Convert 'Standard_D4s_v5' -> 'D4s v5'
-    """
-    s = size_name
-    s = s.replace("Standard_", "")
-    s = s.replace("_", " ")
-    # ensure " v" spacing exists (already achieved by replacing "_")
-    return s
+HOURLY_UNITS = ("1 Hour", "Hour", "hours", "1 hour")
 
-def retail_price_for_size(region: str, size_name: str, spot: bool) -> Optional[Decimal]:
+@lru_cache(maxsize=None)
+def load_region_price_index(region: str) -> Dict[Tuple[str, bool], Decimal]:
     """
-    Best-effort retail price lookup for Linux VM in a region.
-    We:
-      - filter by serviceName eq 'Virtual Machines'
-      - armRegionName eq <region>
-      - priceType eq 'Consumption'
-      - productName contains 'Spot' iff spot=True
-      - skuName contains the normalized size (e.g. 'D4s v5')
-      - operatingSystem is 'Linux' (when present)
-    Returns the *lowest* unitPrice among matching meters.
+    Fetch the region's whole Linux VM retail catalog once and index it as
+    {(armSkuName lower-cased, is_spot): lowest hourly unitPrice}.
+    One paged query replaces a filtered query per (size, spot) pair.
+    Rows are kept under the same rules as the old per-size lookup:
+      - Windows products are dropped
+      - spot rows are those whose meterName contains 'Spot'
+      - 'Low Priority' meters never count as on-demand
+      - only hourly units of measure
     """
-    sshort = short_size_name(size_name)
-    print(f"Looking up retail price for size '{size_name}' (as '{sshort}') in region '{region}', spot={spot}", flush=True)
-
-    # Build $filter
-    bits = [
+    region_l = region.lower()
+    q = " and ".join([
         "serviceName eq 'Virtual Machines'",
-        f"armRegionName eq '{region.lower()}'",
+        f"armRegionName eq '{region_l}'",
         "priceType eq 'Consumption'",
-        f"contains(skuName, '{sshort}')",
-    ]
-    if spot:
-        bits.append("contains(meterName, 'Spot')")
-    
-    # OS filter is sometimes in 'operatingSystem'
-    # # We include it but don't rely solely on it.
-    # # (If it filters out too much, we still have size/region/productName gates.)
-    # bits.append("(operatingSystem eq 'Linux' or operatingSystem eq null)")
+    ])
+    print(f"Loading retail price catalog for region '{region}'...", flush=True)
 
-    q = " and ".join(bits)
-    params = {"$filter": q}
-    
-    best: Optional[Decimal] = None
-    item_iter = _retail_iter(params)
-    for item in item_iter:
-        print(f"  Found item: [{item.get('skuName')}], meterName: [{item.get('meterName')}] with price {item.get('unitPrice')}", flush=True)
-        # Extra defensive checks:
+    index: Dict[Tuple[str, bool], Decimal] = {}
+    for item in _retail_iter({"$filter": q}):
         if item.get("serviceName") != "Virtual Machines":
-            print(f"  Skipping item with unexpected serviceName: {item.get('serviceName')}", flush=True)
-            continue
-        # Skip if windows OS
-        if "windows" in (item.get("productName") or "").lower():
-            print(f"  Skipping Windows item: {item.get('productName')}", flush=True)
             continue
-        if (item.get("armRegionName") or "").lower() != region.lower():
-            print(f"  Skipping item in different region: {item.get('armRegionName')}", flush=True)
+        if (item.get("armRegionName") or "").lower() != region_l:
             continue
-        if spot and "spot" not in (item.get("meterName") or "").lower():
-            print(f"  Skipping non-spot item: {item.get('meterName')}", flush=True)
+        if "windows" in (item.get("productName") or "").lower():
             continue
-        if (not spot) and any(x in (item.get("meterName") or "").lower() for x in ("spot", "low priority")):
-            print(f"  Skipping spot/low priority item: {item.get('meterName')}", flush=True)
+        if item.get("unitOfMeasure") not in HOURLY_UNITS:
             continue
-        if sshort.lower() not in (item.get("skuName") or "").lower():
-            print(f"  Skipping item with different SKU: {item.get('skuName')}", flush=True)
+        arm_sku = (item.get("armSkuName") or "").lower()
+        if not arm_sku:
             continue
-        if item.get("unitOfMeasure") not in ("1 Hour", "Hour", "hours", "1 hour"):
-            print(f"  Skipping item with unexpected unitOfMeasure: {item.get('unitOfMeasure')}", flush=True)
+        meter = (item.get("meterName") or "").lower()
+        is_spot = "spot" in meter
+        if not is_spot and "low priority" in meter:
             continue
 
         price = item.get("unitPrice")
         if price is None:
-            print(f"  Skipping item with no unitPrice: {item}", flush=True)
             continue
         try:
             dec = Decimal(str(price))
         except Exception:
-            print(f"  Skipping item with invalid unitPrice: {item}", flush=True)
             continue
-        if best is None or dec < best:
-            best = dec
+        key = (arm_sku, is_spot)
+        if key not in index or dec < index[key]:
+            index[key] = dec
+
+    print(f"  Indexed {len(index)} retail prices for region '{region}'", flush=True)
+    return index
 
-    return best
+def retail_price_for_size(region: str, size_name: str, spot: bool) -> Optional[Decimal]:
+    """
+    Best-effort retail price lookup for Linux VM in a region.
+    Returns the *lowest* hourly unitPrice among matching meters, or None.
+    The region's catalog is fetched once (see load_region_price_index).
+    """
+    return load_region_price_index(region).get((size_name.lower(), spot))
 
 # ----------------- Main -----------------
 
@@ -278,9 +271,19 @@ def main():
     print(f"  Found {len(skus)} VM SKUs in {region}", flush=True)
 
     # Filter by family
-    skus = [s for s in skus if size_matches_family(s.name or "", families)]
+    prefixes = family_match_prefixes(families)
+    skus = [s for s in skus if size_matches_family(s.name or "", prefixes)]
     print(f"  {len(skus)} match family '{families}'", flush=True)
 
+    # Warm the region price index once; if the catalog can't be fetched, every
+    # size is reported unpriced instead of re-attempting the download per size.
+    try:
+        load_region_price_index(region)
+        pricing_ok = True
+    except Exception as e:
+        print(f"  Retail price catalog unavailable for '{region}': {e}", flush=True)
+        pricing_ok = False
+
     # zones_out: List[dict] = []
     zone_flavors: Dict[str, List[dict]] = {}
 
@@ -310,16 +313,8 @@ def main():
         print(f"  Size '{size_name}' has {vcpus} vCPUs, {mem_gb_str} RAM, GPU: {gpu_info}", flush=True)
 
         # # Prices (once per size; reused across zones)
-        try:
-            print(f"  Looking up prices for size '{size_name}' in region '{region}'...", flush=True)
-            ond = retail_price_for_size(region, size_name, spot=False)
-        except Exception:
-            ond = None
-        try:
-            print(f"  Looking up Spot price for size '{size_name}' in region '{region}'...", flush=True)
-            spot = retail_price_for_size(region, size_name, spot=True)
-        except Exception:
-            spot = None
+        ond = retail_price_for_size(region, size_name, spot=False) if pricing_ok else None
+        spot = retail_price_for_size(region, size_name, spot=True) if pricing_ok else None
 
         # Emit an entry for each requested zone that is supported by this size
         for z_req in zones:
@@ -19,6 +19,15 @@ Environment variables:
   FAMILY                (required) comma-separated machine family prefixes (e.g. "n2,e2,c3,a2")
   GCP_PROJECT           (optional) used for quota context (not strictly required here)
   SPOT_LOOKBACK_HOURS   (optional) accepted for parity; unused on GCP (kept for interface compat)
+  GCP_COMPUTE_BILLING_SERVICE (optional) Cloud Billing service for Compute Engine
+                        (default services/6F81-5844-456A; empty = discover at runtime)
+  CACHE_DIR             (optional) on-disk cache directory (default ~/.cache/instance-finder)
+  SKU_CACHE_TTL_HOURS   (optional) max age of the on-disk SKU price index
+                        (default CACHE_TTL_HOURS, else 24; 0 disables reuse)
+  SKIP_PRICING          (optional) any non-empty value skips Cloud Billing; all prices are null
+  PRICING_CATALOG_JSON  (optional) path to a SKU index file (rows of [family, spot, kind, region, nanos],
+                        the on-disk cache format) used instead of the Cloud Billing catalog
+  VERBOSE               (optional) any non-empty value logs each family's core/RAM rates
   GOOGLE_APPLICATION_CREDENTIALS (optional) path to a service account key.json, or use ADC.
 
 Auth:
@@ -27,15 +36,19 @@ Auth:
 
 Note:
   - GPU info on GCP is generally attached as an accelerator, not part of machine type.
-  As a best-effort, we detect A2 family machine types (e.g., a2-highgpu-4g) and infer GPU count.
+  As a best-effort, accelerator-optimized machine types (e.g., a2-highgpu-4g, a3-highgpu-8g,
+  g2-standard-24) that report no accelerators are resolved from a static table.
   - Pricing mapping relies on best-effort matching of Cloud Billing SKUs to machine families and region.
   If a SKU cannot be found, price fields will be null.
 """
 
+import hashlib
 import json
 import os
 import re
-from decimal import Decimal, ROUND_HALF_UP, ROUND_HALF_DOWN
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from typing import Dict, List, Optional, Tuple
 
 # ---- GCP SDKs ----
@@ -45,19 +58,47 @@ from google.auth import default as google_auth_default
 from google.oauth2 import service_account
 from googleapiclient.discovery import build as google_api_build
 
+# SKU prices change on the order of weeks; warm runs reuse the region's index.
+# Reuse across runs needs CACHE_DIR on a persistent volume (see pod.yaml).
+CACHE_DIR = os.path.expanduser(os.environ.get("CACHE_DIR") or "~/.cache/instance-finder")
+
+def _cache_ttl_seconds(default_hours: float = 24) -> int:
+  """
+  SKU_CACHE_TTL_HOURS (else the image-wide CACHE_TTL_HOURS) in seconds; malformed
+  values fall back to the default, negatives to 0.
+  """
+  try:
+    hours = float(os.environ.get("SKU_CACHE_TTL_HOURS", os.environ.get("CACHE_TTL_HOURS", default_hours)))
+    return max(0, int(hours * 3600))
+  except (ValueError, OverflowError):
+    return int(default_hours * 3600)
+
+CACHE_TTL_SECONDS = _cache_ttl_seconds()
+
+# Pricing debug lines (per-family core/RAM rates) are opt-in
+VERBOSE = bool(os.environ.get("VERBOSE"))
+
+# Inventory-only runs can skip Cloud Billing, or price from a local catalog file
+SKIP_PRICING = bool(os.environ.get("SKIP_PRICING"))
+PRICING_CATALOG_JSON = os.environ.get("PRICING_CATALOG_JSON")
+
 # --------------- Helpers ---------------
 
-def dec_to_str_money(d: Optional[Decimal]) -> Optional[str]:
-  if d is None:
+NANOS_PER_UNIT = 1_000_000_000
+
+def nanos_to_str_money(nanos: Optional[int]) -> Optional[str]:
+  # Round half up to 4 decimal places (units of 1e5 nanos) in integer math
+  if nanos is None:
     return None
-  return f"${d.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)}"
+  ticks = (nanos + 50_000) // 100_000
+  return f"${ticks // 10_000}.{ticks % 10_000:04d}"
 
 def mb_to_gb_str(mb: Optional[int]) -> Optional[str]:
   if mb is None:
     return None
-  gb = Decimal(mb) / Decimal(1000)  # MB to GB (decimal)
-  gb_rounded = gb.quantize(Decimal('1'), rounding=ROUND_HALF_DOWN)  # nearest whole GB
-  return f"{gb_rounded}GB"
+  # MB to GB (decimal), to the nearest whole GB with exact halves rounded down
+  gb, rem = divmod(mb, 1000)
+  return f"{gb + (rem > 500)}GB"
 
 def to_title_label(machine_type_name: str) -> str:
   return machine_type_name.replace("-", " ").title()
@@ -84,62 +125,123 @@ def get_families() -> List[str]:
     raise SystemExit("Missing required env var: FAMILY")
   return [f.strip().lower() for f in family.split(",") if f.strip()]
 
-def filter_by_family(machine_type_name: str, families: List[str]) -> bool:
-  # Accept if the machine type name starts with any of the given family prefixes.
+def family_match_prefixes(families: List[str]) -> Tuple[str, ...]:
+  return tuple(f"{fam.lower()}-" for fam in families)
+
+def filter_by_family(machine_type_name: str, prefixes: Tuple[str, ...]) -> bool:
+  # Accept if the machine type belongs to one of the given families, matched on
+  # whole name segments: "n2" takes n2-standard-4 but not n2d-standard-4, and a
+  # full name like "e2-micro" matches itself (hence the appended '-').
   # Examples: n2-standard-4, e2-standard-2, c3-highcpu-8, a2-highgpu-4g
-  lower_name = machine_type_name.lower()
-  return any(lower_name.startswith(fam + "-") or lower_name.startswith(fam) for fam in families)
+  return f"{machine_type_name.lower()}-".startswith(prefixes)
+
+# ---- GPU detection ----
+# Accelerator type -> short model name / per-GPU memory
+GPU_MODEL_MAP = {
+  "nvidia-tesla-a100": "a100",
+  "nvidia-tesla-v100": "v100",
+  "nvidia-tesla-p100": "p100",
+  "nvidia-tesla-t4": "t4",
+  "nvidia-tesla-p4": "p4",
+  "nvidia-a100-80gb": "a100",
+  "nvidia-a100-40gb": "a100",
+  "nvidia-h100-80gb": "h100",
+  "nvidia-h100-mega-80gb": "h100",
+  "nvidia-h200-141gb": "h200",
+  "nvidia-gb200": "gb200",
+  "nvidia-b200": "b200",
+  "nvidia-rtx-pro-6000": "rtx-pro-6000",
+  "nvidia-rtx-pro-6000-vws": "rtx-pro-6000",
+  "nvidia-l4": "l4",
+  "nvidia-l4-vws": "l4",
+}
+GPU_MEMORY_MAP = {
+  "nvidia-tesla-a100": "40GB",
+  "nvidia-h100-mega-80gb": "80GB",
+  "nvidia-tesla-v100": "16GB",
+  "nvidia-tesla-p100": "16GB",
+  "nvidia-tesla-t4": "16GB",
+  "nvidia-tesla-p4": "8GB",
+  "nvidia-k80": "12GB",
+  "nvidia-a100-80gb": "80GB",
+  "nvidia-a100-40gb": "40GB",
+  "nvidia-h100-80gb": "80GB",
+  "nvidia-h200-141gb": "141GB",
+  "nvidia-gb200": "80GB",
+  "nvidia-b200": "80GB",
+  "nvidia-l4": "24GB",
+  "nvidia-rtx-a5000": "24GB",
+  "nvidia-rtx-a6000": "48GB",
+  "nvidia-rtx-pro-6000": "24GB",
+}
 
-# ---- GPU heuristics for A2 ----
-def extract_gpu_info(mt) -> Dict:
-  MAPPING = {
-    "nvidia-tesla-v100": "v100",
-    "nvidia-tesla-p100": "p100",
-    "nvidia-tesla-t4": "t4",
-    "nvidia-tesla-p4": "p4",
-    "nvidia-a100-80gb": "a100",
-    "nvidia-a100-40gb": "a100",
-    "nvidia-h100-80gb": "h100",
-    "nvidia-h100-mega-80gb": "h100",
-    "nvidia-h200-141gb": "h200",
-    "nvidia-gb200": "gb200",
-    "nvidia-b200": "b200",
-    "nvidia-rtx-pro-6000": "rtx-pro-6000",
-    "nvidia-rtx-pro-6000-vws": "rtx-pro-6000",
-    "nvidia-l4": "l4",
-    "nvidia-l4-vws": "l4",
-  }
-  MEMORY_MAP = {
-    "nvidia-tesla-v100": "16GB",
-    "nvidia-tesla-p100": "16GB",
-    "nvidia-tesla-t4": "16GB",
-    "nvidia-tesla-p4": "8GB",
-    "nvidia-k80": "12GB",
-    "nvidia-a100-80gb": "80GB",
-    "nvidia-a100-40gb": "40GB",
-    "nvidia-h100-80gb": "80GB",
-    "nvidia-h200-141gb": "141GB",
-    "nvidia-gb200": "80GB",
-    "nvidia-b200": "80GB",
-    "nvidia-l4": "24GB",
-    "nvidia-rtx-a5000": "24GB",
-    "nvidia-rtx-a6000": "48GB",
-    "nvidia-rtx-pro-6000": "24GB",
-  }
+# Shared result for the (common) GPU-less case; callers must not mutate it
+NO_GPU = {"enabled": False, "manufacturer": None, "count": 0, "model": None, "memory": None}
 
-  def _clean_model(acc_type_raw: Optional[str]) -> Optional[str]:
-    if not acc_type_raw:
-      return None
-    s = str(acc_type_raw).split("/")[-1].lower()
-    if s in MAPPING:
-      return MAPPING[s]
-    s = re.sub(r'^(nvidia(?:-tesla)?)-', '', s)
-    s = re.sub(r'-vws$', '', s)
-    s = re.sub(r'-mega-\d+gb$', '', s)
-    s = re.sub(r'-\d+gb$', '', s)
-    s = s.strip('-')
-    return s or None
+_GPU_VENDOR_PREFIX_RE = re.compile(r'^(nvidia(?:-tesla)?)-')
+_GPU_VWS_SUFFIX_RE = re.compile(r'-vws$')
+_GPU_MEGA_MEM_SUFFIX_RE = re.compile(r'-mega-\d+gb$')
+_GPU_MEM_SUFFIX_RE = re.compile(r'-\d+gb$')
+def _clean_model(acc_type_raw: Optional[str]) -> Optional[str]:
+  if not acc_type_raw:
+    return None
+  s = str(acc_type_raw).split("/")[-1].lower()
+  if s in GPU_MODEL_MAP:
+    return GPU_MODEL_MAP[s]
+  s = _GPU_VENDOR_PREFIX_RE.sub('', s)
+  s = _GPU_VWS_SUFFIX_RE.sub('', s)
+  s = _GPU_MEGA_MEM_SUFFIX_RE.sub('', s)
+  s = _GPU_MEM_SUFFIX_RE.sub('', s)
+  s = s.strip('-')
+  return s or None
+
+# Accelerator-optimized machine types carry fixed GPUs. When the API response
+# lists no accelerators for them, fall back to this table:
+# machine type -> (accelerator type, count).
+INSTANCE_TYPE_TO_ACC = {
+  "a2-highgpu-1g": ("nvidia-tesla-a100", 1),
+  "a2-highgpu-2g": ("nvidia-tesla-a100", 2),
+  "a2-highgpu-4g": ("nvidia-tesla-a100", 4),
+  "a2-highgpu-8g": ("nvidia-tesla-a100", 8),
+  "a2-megagpu-16g": ("nvidia-tesla-a100", 16),
+  "a2-ultragpu-1g": ("nvidia-a100-80gb", 1),
+  "a2-ultragpu-2g": ("nvidia-a100-80gb", 2),
+  "a2-ultragpu-4g": ("nvidia-a100-80gb", 4),
+  "a2-ultragpu-8g": ("nvidia-a100-80gb", 8),
+  "a3-highgpu-1g": ("nvidia-h100-80gb", 1),
+  "a3-highgpu-2g": ("nvidia-h100-80gb", 2),
+  "a3-highgpu-4g": ("nvidia-h100-80gb", 4),
+  "a3-highgpu-8g": ("nvidia-h100-80gb", 8),
+  "a3-edgegpu-8g": ("nvidia-h100-80gb", 8),
+  "a3-megagpu-8g": ("nvidia-h100-mega-80gb", 8),
+  "a3-ultragpu-8g": ("nvidia-h200-141gb", 8),
+  "a4-highgpu-8g": ("nvidia-b200", 8),
+  "a4x-highgpu-4g": ("nvidia-gb200", 4),
+  "g2-standard-4": ("nvidia-l4", 1),
+  "g2-standard-8": ("nvidia-l4", 1),
+  "g2-standard-12": ("nvidia-l4", 1),
+  "g2-standard-16": ("nvidia-l4", 1),
+  "g2-standard-24": ("nvidia-l4", 2),
+  "g2-standard-32": ("nvidia-l4", 1),
+  "g2-standard-48": ("nvidia-l4", 4),
+  "g2-standard-96": ("nvidia-l4", 8),
+}
+
+def _gpu_info(acc_type_raw: Optional[str], count: int) -> Dict:
+  s_raw = str(acc_type_raw).split("/")[-1].lower() if acc_type_raw else None
+  model_clean = GPU_MODEL_MAP.get(s_raw) or _clean_model(s_raw)
+  model = model_clean.capitalize() if model_clean else None
+  memory = GPU_MEMORY_MAP.get(s_raw) or GPU_MEMORY_MAP.get(model_clean)
+
+  return {
+    "enabled": count > 0,
+    "manufacturer": "NVIDIA" if count > 0 else None,
+    "count": count if count > 0 else 0,
+    "model": model,
+    "memory": memory,
+  }
 
+def extract_gpu_info(mt) -> Dict:
   name = getattr(mt, "name", "") or ""
 
   # Support multiple possible field names for legacy/new client libs
@@ -150,9 +252,9 @@ def extract_gpu_info(mt) -> Dict:
     or []
   ) or []
 
-  # Step 1: Check accelerators field (covers n1 GPU machine types)
-  if accelerators:
-    acc = accelerators[0]
+  # Step 1: Check accelerators field (covers n1 GPU machine types). Only NVIDIA
+  # accelerators count as GPUs; TPU-attached types must not be labelled as such.
+  for acc in accelerators:
     # accelerator objects/ dicts may expose different attribute names
     acc_type_raw = (
       getattr(acc, "guest_accelerator_type", None)
@@ -161,6 +263,8 @@ def extract_gpu_info(mt) -> Dict:
       or (acc.get("guestAcceleratorType") if isinstance(acc, dict) else None)
       or (acc.get("type") if isinstance(acc, dict) else None)
     )
+    if not acc_type_raw or "nvidia" not in str(acc_type_raw).lower():
+      continue
     count = int(
       getattr(acc, "guest_accelerator_count", None)
       or getattr(acc, "accelerator_count", None)
@@ -168,37 +272,16 @@ def extract_gpu_info(mt) -> Dict:
       or (acc.get("guestAcceleratorCount") if isinstance(acc, dict) else 0)
       or 0
     )
-    s_raw = str(acc_type_raw).split("/")[-1].lower() if acc_type_raw else None
-    model_clean = MAPPING.get(s_raw) or _clean_model(s_raw)
-    model = model_clean.capitalize() if model_clean else None
-    memory = MEMORY_MAP.get(s_raw) or MEMORY_MAP.get(model_clean)
-
-    return {
-      "enabled": count > 0,
-      "manufacturer": "NVIDIA" if count > 0 else None,
-      "count": count if count > 0 else 0,
-      "model": model,
-      "memory": memory,
-    }
+    return _gpu_info(acc_type_raw, count)
 
-  # Step 2: A2-style names (a2-...-N)
-  _A2_GPU_SUFFIX_RE = re.compile(r"a2-(?:.+)-(\d+)$")
-  if name.lower().startswith("a2-"):
-    m = _A2_GPU_SUFFIX_RE.search(name.lower())
-    count = int(m.group(1)) if m else 0
-    enabled = count > 0
-    model_clean = "a100" if enabled else None
-    memory = MEMORY_MAP.get("nvidia-a100-80gb") or MEMORY_MAP.get("nvidia-a100-40gb")
-    return {
-      "enabled": enabled,
-      "manufacturer": "NVIDIA" if enabled else None,
-      "count": count if enabled else 0,
-      "model": model_clean,
-      "memory": memory,
-    }
+  # Step 2: Known accelerator-optimized machine types
+  known = INSTANCE_TYPE_TO_ACC.get(name.lower())
+  if known:
+    return _gpu_info(*known)
 
   # No GPU
-  return {"enabled": False, "manufacturer": None, "count": 0, "model": None, "memory": None}
+  return NO_GPU
+
 # ---- Pricing via Cloud Billing Catalog API ----
 
 # Family labels we try to match against SKU descriptions.
@@ -216,11 +299,18 @@ FAMILY_SKU_HINTS = {
   "a2":  ("A2",),  # A2 CPU/RAM still charged, plus separate GPU SKUs if you attach more
 }
 
+# Compute Engine's Cloud Billing service ID is stable. An empty override makes
+# get_compute_service_name discover it by paging the services catalog instead.
+COMPUTE_SERVICE_NAME = os.environ.get("GCP_COMPUTE_BILLING_SERVICE", "services/6F81-5844-456A")
+
 def get_compute_service_name(billing_service) -> str:
   """
-  Find the Cloud Billing 'serviceName' for Compute Engine.
-  We discover it at runtime to avoid hardcoding the ID.
+  Return the Cloud Billing 'serviceName' for Compute Engine: the well-known ID
+  (or GCP_COMPUTE_BILLING_SERVICE) without any API call, or, if that is set
+  empty, the one found by scanning the services catalog.
   """
+  if COMPUTE_SERVICE_NAME:
+    return COMPUTE_SERVICE_NAME
   req = billing_service.services().list()
   while req is not None:
     resp = req.execute()
@@ -230,7 +320,7 @@ def get_compute_service_name(billing_service) -> str:
     req = billing_service.services().list_next(previous_request=req, previous_response=resp)
   raise RuntimeError("Could not find Cloud Billing service for Compute Engine")
 
-def _unit_price_to_decimal(pricing_info: dict) -> Optional[Decimal]:
+def _unit_price_to_nanos(pricing_info: dict) -> Optional[int]:
   tiers = pricing_info.get("pricingExpression", {}).get("tieredRates", [])
   if not tiers:
     return None
@@ -238,142 +328,229 @@ def _unit_price_to_decimal(pricing_info: dict) -> Optional[Decimal]:
   unit_amount = tiers[0].get("unitPrice", {})
   nanos = unit_amount.get("nanos", 0)
   units = int(unit_amount.get("units", 0))
-  return Decimal(units) + (Decimal(nanos) / Decimal(1_000_000_000))
+  return units * NANOS_PER_UNIT + int(nanos)
 
-def _region_in_desc(desc: str, region: str) -> bool:
-  # SKU descriptions often say "... running in Iowa" or "... in us-central1".
-  # Try to match exact region or region pretty-name is not trivial; prefer exact region code.
-  r = region.lower()
-  d = desc.lower()
-  return r in d
-
-def _matches_family(desc: str, fam: str) -> bool:
+def _family_hints(fam: str) -> Tuple[str, ...]:
+  """Lowercased description tokens that identify SKUs of family `fam`."""
   fam = fam.lower()
-  desc_l = desc.lower()
-  hints = FAMILY_SKU_HINTS.get(fam, (fam.upper(),))
-  return any(h.lower() in desc_l for h in hints)
-
-def _usage_type_ok(sku: dict, want_spot: bool) -> bool:
-  # Cloud Billing uses "usageType" values like "OnDemand", "Preemptible".
-  # Spot is the new name; catalog may still say "Preemptible".
-  usage = sku.get("category", {}).get("usageType", "")
-  if want_spot:
-    return usage.lower() in ("preemptible", "spot")
-  return usage.lower() == "ondemand"
-
-def _is_core_or_ram(sku: dict) -> Optional[str]:
+  return tuple(h.lower() for h in FAMILY_SKU_HINTS.get(fam, (fam.upper(),)))
+
+def _compile_family_hints(families) -> Tuple["re.Pattern[str]", Dict[str, List[str]]]:
+  """
+  Build one alternation over every family's hint tokens, plus a token -> families
+  map, so a single scan of a SKU description finds all families it belongs to.
+  Tokens match as whole words: "N2" must not claim "N2D" SKUs.
+  """
+  owners: Dict[str, List[str]] = {}
+  for fam in sorted(set(families)):
+    for h in _family_hints(fam):
+      owners.setdefault(h, []).append(fam)
+  alternation = "|".join(re.escape(h) for h in sorted(owners, key=len, reverse=True))
+  return re.compile(rf"\b(?:{alternation})\b"), owners
+
+def _usage_is_spot(sku: dict) -> Optional[bool]:
+  """
+  Return False for on-demand SKUs, True for spot/preemptible ones, None otherwise.
+  Cloud Billing uses "usageType" values like "OnDemand", "Preemptible";
+  Spot is the new name, but the catalog may still say "Preemptible".
+  """
+  usage = sku.get("category", {}).get("usageType", "").lower()
+  if usage == "ondemand":
+    return False
+  if usage in ("preemptible", "spot"):
+    return True
+  return None
+
+def _is_core_or_ram(sku: dict, desc_l: str) -> Optional[str]:
   """
   Return "core" or "ram" if this SKU is a vCPU/RAM meter; None otherwise.
+  The structured category decides where it can: only Compute SKUs qualify, and
+  resourceGroup "CPU"/"RAM"/"GPU" is authoritative. Legacy groups such as
+  "N1Standard" bundle both meters, so those fall back to the lowercased description.
   """
-  desc = sku.get("description", "")
-  desc_l = desc.lower()
+  category = sku.get("category", {})
+  if category.get("resourceFamily") != "Compute":
+    return None
+  group = category.get("resourceGroup", "")
+  if group == "CPU":
+    return "core"
+  if group == "RAM":
+    return "ram"
+  if group == "GPU":
+    return None
   if "instance core" in desc_l or "vcpu" in desc_l or "core running" in desc_l:
     return "core"
   if "ram" in desc_l or "memory" in desc_l:
     return "ram"
   return None
 
-def fetch_family_core_ram_prices(
-  billing_service,
-  compute_service_name: str,
-  region: str,
-  family_prefix: str,
-  want_spot: bool,
-) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+# Prices are kept as integer nanos (USD * 1e9), the catalog's own resolution
+SkuIndex = Dict[Tuple[str, bool, str, str], int]
+
+# The v1 skus.list call has no server-side filter, so ask only for the fields we
+# read: this drops SKU ids, geo taxonomy, aggregation info, etc. from every page.
+SKU_LIST_FIELDS = (
+  "nextPageToken,"
+  "skus(description,category(resourceFamily,resourceGroup,usageType),serviceRegions,"
+  "pricingInfo/pricingExpression/tieredRates/unitPrice)"
+)
+
+def load_sku_index(billing_service, compute_service_name: str, families, region: Optional[str] = None) -> SkuIndex:
   """
-  Return (core_price_per_hour, ram_price_per_hour) for the given family & region & usage type.
-  Prices are hourly per vCPU and per GiB RAM.
+  Page the Compute Engine SKU catalog once and index core/RAM unit prices by
+  (family_prefix, want_spot, kind, region). Regions come from each SKU's
+  serviceRegions list; if `region` is given, SKUs not sold there are skipped.
+  When several SKUs match a key, the first one in catalog order wins, as the
+  old per-family scan did.
   """
-  core_price = None
-  ram_price = None
+  hint_re, owners = _compile_family_hints(families)
+  index: SkuIndex = {}
+  if not owners:
+    return index
 
   req = billing_service.services().skus().list(
     parent=compute_service_name,
     pageSize=5000,  # big page to reduce pagination churn
+    fields=SKU_LIST_FIELDS,
   )
-  while req is not None and (core_price is None or ram_price is None):
+  while req is not None:
     resp = req.execute()
     for sku in resp.get("skus", []):
-      if not _usage_type_ok(sku, want_spot):
+      regions = sku.get("serviceRegions", [])
+      if region is not None:
+        if region not in regions:
+          continue
+        regions = (region,)
+      want_spot = _usage_is_spot(sku)
+      if want_spot is None:
         continue
-      desc = sku.get("description", "")
-      kind = _is_core_or_ram(sku)
+      desc_l = sku.get("description", "").lower()
+      kind = _is_core_or_ram(sku, desc_l)
       if not kind:
         continue
-      if not _region_in_desc(desc, region):
-        # Some SKUs are region-agnostic or use location names; also check regions in pricingInfo
-        # Try pricingInfo regions
-        regions = []
-        for pi in sku.get("pricingInfo", []):
-          regions.extend(pi.get("pricingExpression", {}).get("usageUnitDescription", "").lower().split())
-          regions.extend([r.lower() for r in pi.get("aggregationInfo", {}).get("aggregations", [])])
-        # (Above is a weak fallback; main path is desc match.)
-        # We still allow if desc didn't include region but category/resourceGroup hints match.
-        pass
-
-      if not _matches_family(desc, family_prefix):
+      fams = {fam for m in hint_re.finditer(desc_l) for fam in owners[m.group(0)]}
+      if not fams:
         continue
 
-      # Extract unit price from pricingInfo
+      price = None
       for pi in sku.get("pricingInfo", []):
-        # Some SKUs have region-specific segments; prefer ones whose summary mentions the region
-        if region.lower() not in json.dumps(pi).lower() and not _region_in_desc(desc, region):
-          # Keep going; we still may take it if no region-specific match is found.
-          pass
-        price = _unit_price_to_decimal(pi)
-        if price is None:
-          continue
-        if kind == "core" and core_price is None:
-          core_price = price
-        if kind == "ram" and ram_price is None:
-          ram_price = price
-        if core_price is not None and ram_price is not None:
+        price = _unit_price_to_nanos(pi)
+        if price is not None:
           break
+      if price is None:
+        continue
 
-      if core_price is not None and ram_price is not None:
-        break
+      for r in regions:
+        for fam in fams:
+          index.setdefault((fam, want_spot, kind, r), price)
 
     req = billing_service.services().skus().list_next(previous_request=req, previous_response=resp)
 
-  return core_price, ram_price
+  return index
 
-def estimate_machine_price(
-  billing_service,
-  compute_service_name: str,
-  region: str,
-  machine_type_name: str,
-  vcpus: int,
-  mem_mb: int,
-) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+def cache_load(name):
+  path = os.path.join(CACHE_DIR, f"gcp_{name}.json")
+  try:
+    if time.time() - os.path.getmtime(path) >= CACHE_TTL_SECONDS:
+      return None
+    with open(path) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+def cache_store(name, value):
+  # Best effort: a read-only or missing home must not fail the run
+  path = os.path.join(CACHE_DIR, f"gcp_{name}.json")
+  try:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+      json.dump(value, f)
+    os.replace(tmp, path)
+  except OSError as e:
+    print(f"  Could not write cache {path}: {e}", flush=True)
+
+def disk_cached(key_fn, encode=lambda v: v, decode=lambda v: v):
   """
-  Returns (on_demand_hourly, spot_hourly) as Decimals or None if not found.
-  Approximates price = (vCPU_count * per-vCPU) + (GiB_RAM * per-GiB) using SKUs that match the family.
+  Serve fn(*args) from the JSON cache entry named key_fn(*args) while it is
+  younger than CACHE_TTL_SECONDS; otherwise call through and store the result.
+  Empty results (API hiccups, wrong service name, region typos) are not stored.
   """
-  # Deduce family prefix (segment before first '-'), e.g., 'n2', 'e2', 'c3', 'a2'...
-  fam = machine_type_name.split("-", 1)[0].lower()
+  def deco(fn):
+    @wraps(fn)
+    def wrapper(*args):
+      name = key_fn(*args)
+      cached = cache_load(name)
+      if cached is not None:
+        return decode(cached)
+      result = fn(*args)
+      if result:
+        cache_store(name, encode(result))
+      return result
+    return wrapper
+  return deco
+
+def _sku_index_cache_key(creds, region, families):
+  # The billing service is part of the key so a GCP_COMPUTE_BILLING_SERVICE override never reuses another service's index
+  key_src = f"{COMPUTE_SERVICE_NAME}|{','.join(sorted(families))}"
+  digest = hashlib.sha1(key_src.encode()).hexdigest()[:16]
+  return f"skus_v3_{region}_{digest}"
+
+# JSON has no tuple keys: entries are stored as [family, want_spot, kind, region, nanos]
+def sku_index_to_rows(index: SkuIndex) -> list:
+  return [[*key, nanos] for key, nanos in index.items()]
+
+def sku_index_from_rows(rows: list) -> SkuIndex:
+  return {tuple(row[:4]): row[4] for row in rows}
+
+@disk_cached(_sku_index_cache_key, encode=sku_index_to_rows, decode=sku_index_from_rows)
+def load_region_sku_index(creds, region: str, families) -> SkuIndex:
+  """Build the SKU index for `region`; a cache hit skips the Billing API entirely."""
+  # The discovery document bundled with google-api-python-client is used, never fetched
+  billing_service = google_api_build(
+    "cloudbilling", "v1", credentials=creds, cache_discovery=False, static_discovery=True
+  )
+  compute_service_name = get_compute_service_name(billing_service)
+  return load_sku_index(billing_service, compute_service_name, families, region)
 
-  # Convert MB to GiB
-  ram_gib = Decimal(mem_mb) / Decimal(1024)
+def load_pricing(creds, region: str, families) -> SkuIndex:
+  """
+  SKU index for this run: empty when SKIP_PRICING is set (all prices null), read
+  from PRICING_CATALOG_JSON when given (same row format as the disk cache), and
+  otherwise built from the Cloud Billing catalog.
+  """
+  if SKIP_PRICING:
+    return {}
+  if PRICING_CATALOG_JSON:
+    with open(PRICING_CATALOG_JSON) as f:
+      return sku_index_from_rows(json.load(f))
+  return load_region_sku_index(creds, region, families)
 
-  # On-demand
-  print(f"    Estimating prices for {machine_type_name} (family {fam})...", flush=True)
-  core_price_od, ram_price_od = fetch_family_core_ram_prices(
-    billing_service, compute_service_name, region, fam, want_spot=False
-  )
-  on_demand = None
-  if core_price_od is not None and ram_price_od is not None:
-    on_demand = (Decimal(vcpus) * core_price_od) + (ram_gib * ram_price_od)
-
-  # Spot / Preemptible
-  print(f"    Estimating spot prices for {machine_type_name} (family {fam})...", flush=True)
-  core_price_spot, ram_price_spot = fetch_family_core_ram_prices(
-    billing_service, compute_service_name, region, fam, want_spot=True
+def fetch_family_core_ram_prices(
+  sku_index: SkuIndex,
+  region: str,
+  family_prefix: str,
+  want_spot: bool,
+) -> Tuple[Optional[int], Optional[int]]:
+  """
+  Return (core_price_per_hour, ram_price_per_hour) for the given family & region & usage type.
+  Prices are hourly nanos per vCPU and per GiB RAM.
+  """
+  return (
+    sku_index.get((family_prefix, want_spot, "core", region)),
+    sku_index.get((family_prefix, want_spot, "ram", region)),
   )
-  spot = None
-  if core_price_spot is not None and ram_price_spot is not None:
-    spot = (Decimal(vcpus) * core_price_spot) + (ram_gib * ram_price_spot)
 
-  return on_demand, spot
+def machine_price(vcpus: int, mem_mb: int, rates: Tuple[Optional[int], Optional[int]]) -> Optional[int]:
+  """
+  Approximate an hourly price in nanos as (vCPU_count * per-vCPU) + (GiB_RAM * per-GiB)
+  from a family's (core, ram) rates; None if either rate is unknown.
+  RAM is priced per GiB; the MB -> GiB division is rounded half up to the nano.
+  """
+  core_nanos, ram_nanos = rates
+  if core_nanos is None or ram_nanos is None:
+    return None
+  return vcpus * core_nanos + (mem_mb * ram_nanos + 512) // 1024
 
 # --------------- Main ---------------
 
@@ -397,71 +574,116 @@ def main():
 
   # Clients
   mt_client = compute_v1.MachineTypesClient(credentials=creds)
-  billing_service = google_api_build("cloudbilling", "v1", credentials=creds, cache_discovery=False)
-  compute_service_name = get_compute_service_name(billing_service)
 
-  zones_out = []
+  def list_machine_types():
+    # One aggregated RPC covers every requested zone. Both filter expressions are
+    # RE2 full matches: the zone name, and a family-prefix match on the machine
+    # type name (filter_by_family stays as a local post-check). Scope keys look
+    # like "zones/<zone>".
+    zone_candidates = {zone: [] for zone in zones}
+    zone_totals = dict.fromkeys(zones, 0)
+    name_re = "|".join(re.escape(fam.lower()) for fam in families)
+    prefixes = family_match_prefixes(families)
+    request = compute_v1.AggregatedListMachineTypesRequest(
+      project=project,
+      filter=f'(zone eq "({"|".join(zones)})") (name eq "({name_re})(-.*)?")',
+      return_partial_success=True,
+    )
+    for scope, scoped_list in mt_client.aggregated_list(request=request):
+      zone = scope.rsplit("/", 1)[-1]
+      if zone not in zone_candidates:
+        continue
+      for mt in scoped_list.machine_types:
+        zone_totals[zone] += 1
+        if filter_by_family(mt.name, prefixes):
+          zone_candidates[zone].append(mt)
+    return zone_candidates, zone_totals
+
+  # A machine type is priced by the family before its first '-'. Families match
+  # on whole name segments, so those are exactly the first segments of the
+  # requested families: the SKU index can load while the zones are listed.
+  price_families = sorted({fam.lower().split("-", 1)[0] for fam in families})
+  with ThreadPoolExecutor(max_workers=2) as executor:
+    sku_future = executor.submit(load_pricing, creds, region, price_families)
+    zone_candidates, zone_totals = list_machine_types()
+    sku_index = sku_future.result()
 
   for zone in zones:
     print(f"Processing zone: {zone}", flush=True)
+    print(f"  Found {zone_totals[zone]} machine types in {zone} for family '{families}'", flush=True)
+    print(f"  {len(zone_candidates[zone])} match family '{families}'", flush=True)
+  print(f"Loaded Compute Engine SKU catalog: {len(sku_index)} core/RAM prices", flush=True)
+
+  # Rates depend only on (family, region, usage type): resolve them once per
+  # family; machine types then only do the arithmetic.
+  family_rates = {}
+  for fam in sorted(price_families):
+    family_rates[fam] = (
+      fetch_family_core_ram_prices(sku_index, region, fam, want_spot=False),
+      fetch_family_core_ram_prices(sku_index, region, fam, want_spot=True),
+    )
+    if VERBOSE:
+      print(f"  Family {fam}: on-demand core/ram {family_rates[fam][0]}, spot core/ram {family_rates[fam][1]} (nanos)")
+
+  def describe_machine_type(mt) -> dict:
+    vcpus = mt.guest_cpus or 0
+    ram_gb_str = mb_to_gb_str(mt.memory_mb)  # memory_mb is in MB
+    gpu_info = extract_gpu_info(mt)
+
+    # Family prefix is the segment before the first '-', e.g. 'n2', 'e2', 'c3', 'a2'
+    od_rates, spot_rates = family_rates[mt.name.split("-", 1)[0].lower()]
+    ond_price = machine_price(vcpus, mt.memory_mb or 0, od_rates)
+    spot_price = machine_price(vcpus, mt.memory_mb or 0, spot_rates)
+
+    gpu_enabled = gpu_info.get("enabled", False)
+    if gpu_enabled:
+      nameLabel = f"{vcpus}vCPU-{ram_gb_str}-{gpu_info['count']}x{gpu_info['model']}-{gpu_info['memory']}"
+    else:
+      nameLabel = f"{vcpus}vCPU-{ram_gb_str}"
+
+    return {
+      "name": mt.name,
+      "nameLabel": nameLabel,
+      "vcpus": vcpus,
+      "ram": ram_gb_str,
+      "price": nanos_to_str_money(ond_price),
+      # extract_gpu_info already returns exactly the output keys
+      "gpu": gpu_info,
+      "spot": {
+        "price": nanos_to_str_money(spot_price),
+        "enabled": spot_price is not None
+      }
+    }
+
+  # Specs and prices are per region, not per zone: describe each machine type
+  # once and share the entry between the zones that offer it.
+  unique_types = {}
+  for cands in zone_candidates.values():
+    for mt in cands:
+      unique_types.setdefault(mt.name, mt)
+  flavor_by_name = {name: describe_machine_type(mt) for name, mt in sorted(unique_types.items())}
+  priced = sum(1 for f in flavor_by_name.values() if f["price"] is not None)
+  print(f"Priced {priced}/{len(flavor_by_name)} machine types", flush=True)
 
-    # List machine types in zone
-    machine_types = list(mt_client.list(project=project, zone=zone))  # project '-' works for public types
-    print(f"  Found {len(machine_types)} machine types in {zone}", flush=True)
-
-    # Filter by family prefixes
-    candidates = [mt for mt in machine_types if filter_by_family(mt.name, families)]
-    print(f"  {len(candidates)} match family '{families}'", flush=True)
-
-    flavors = []
-    for mt in sorted(candidates, key=lambda m: m.name):
-      vcpus = mt.guest_cpus or 0
-      ram_gb_str = mb_to_gb_str(mt.memory_mb)  # memory_mb is in MB
-      gpu_info = extract_gpu_info(mt)
-
-      ond_price, spot_price = estimate_machine_price(
-        billing_service, compute_service_name, region, mt.name, vcpus, mt.memory_mb or 0
-      )
-
-      gpu_enabled = gpu_info.get("enabled", False)
-      if gpu_enabled:
-        nameLabel = f"{vcpus}vCPU-{ram_gb_str}-{gpu_info['count']}x{gpu_info['model']}-{gpu_info['memory']}"
-      else:
-        nameLabel = f"{vcpus}vCPU-{ram_gb_str}"
-
-      flavors.append({
-        "name": mt.name,
-        "nameLabel": nameLabel,
-        "vcpus": vcpus,
-        "ram": ram_gb_str,
-        "price": dec_to_str_money(ond_price),
-        "gpu": {
-          "enabled": gpu_info["enabled"],
-          "manufacturer": gpu_info["manufacturer"],
-          "count": gpu_info["count"],
-          "model": gpu_info["model"],
-          "memory": gpu_info["memory"],
-        },
-        "spot": {
-          "price": dec_to_str_money(spot_price),
-          "enabled": spot_price is not None
-        }
-      })
-    
+  zones_out = []
+  for zone in zones:
+    # flavor_by_name is already in name order; keep that order per zone
+    offered = {mt.name for mt in zone_candidates[zone]}
     zones_out.append({
       "zone": zone,
-      "zoneOfferings": flavors
+      "zoneOfferings": [flavor for name, flavor in flavor_by_name.items() if name in offered]
     })
 
   output = {
     "region": region,
     "offerings": zones_out
   }
-  OUTPUT = json.dumps(output)
+  OUTPUT = json.dumps(output, separators=(",", ":"))
   print(OUTPUT, flush=True)
   #  print into /dev/termination-log
   with open(output_path, "w") as f:
-    f.write(OUTPUT + "\n")
+    f.write(OUTPUT)
+    f.write("\n")
 
 if __name__ == "__main__":
   main()